@@ -1,86 +1,217 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from datetime import datetime
+from flask_orjson import OrjsonProvider
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+import logging
+import orjson
 from real_mrms_processor import MRMSDataProcessor
 
+# Info/debug records are dropped at the level check in production; set LOG_LEVEL=INFO to see them
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING').upper())
+# Keep werkzeug's "Running on ..." line and access log visible regardless
+logging.getLogger('werkzeug').setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RadarJSONProvider(OrjsonProvider):
+    """orjson provider that also serializes numpy arrays natively"""
+    option = OrjsonProvider.option | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumpb(self, obj):
+        """Serialize like dumps(), but return the raw UTF-8 bytes"""
+        return orjson.dumps(obj, option=self.option, default=self.default)
+
+
 app = Flask(__name__)
+app.json_provider_class = RadarJSONProvider
+app.json = RadarJSONProvider(app)
+# orjson never indents or sorts keys, so responses are already compact and unsorted
 CORS(app)
 
 # Initialize MRMS processor
 mrms_processor = MRMSDataProcessor()
 
 # Cache settings
-cached_data = None
-last_fetch_time = None
 CACHE_DURATION = 120  # 2 minutes
+REFRESH_INTERVAL = 90  # background refresh period, in seconds
+GZIP_LEVEL = 5  # the GeoJSON is highly repetitive, so a mid level already shrinks it ~10x
+
+# Latest radar payload as serialized JSON bytes (plain and gzipped). Snapshots are immutable and
+# published with a single assignment, so readers just grab the reference.
+# fetched_at drives freshness; modified_at (sent as Last-Modified) only moves when the body does.
+CacheSnapshot = namedtuple('CacheSnapshot', 'body gzip_body etag fetched_at modified_at data_url')
+_snapshot = None
+# Guards _refreshing so concurrent misses wait for one fetch instead of all hitting NOAA
+_refresh_cond = threading.Condition()
+_refreshing = False
+
+@lru_cache(maxsize=1)
+def _isoformat_for_second(second):
+    return datetime.fromtimestamp(second).isoformat()
+
+def _now_isoformat():
+    """Current local time in ISO format, formatted at most once per second"""
+    return _isoformat_for_second(int(time.time()))
+
+def _fetch_radar_data():
+    """Fetch and process the latest REAL MRMS data, or fall back to simulation.
+    
+    Returns None when the newest upstream file is the one already cached.
+    """
+    # Formatted once per refresh and baked into the cached body
+    fetched_at = datetime.now().isoformat()
+    
+    # Get real MRMS data URL
+    data_url, timestamp = mrms_processor.get_latest_data_url()
+    
+    if data_url:
+        current = _snapshot
+        # MRMS file URLs embed their timestamp, so the same URL means the same data
+        if current and current.data_url == data_url:
+            logger.info("♻️ Upstream MRMS file unchanged, keeping cached data")
+            return None
+        
+        logger.info("🔗 Using real MRMS data from: %s", data_url)
+        # Process the real MRMS data
+        processed_data = mrms_processor.download_and_process_data(data_url)
+        
+        if processed_data:
+            logger.info("Successfully fetched REAL MRMS data with enhanced simulation")
+            return {
+                'success': True,
+                'timestamp': fetched_at,
+                'dataUrl': data_url,
+                'data': processed_data,
+                'bounds': [[24.396308, -125.000000], [49.384358, -66.934570]],
+                'note': 'Real MRMS Reflectivity at Lowest Altitude (RALA) - Enhanced Simulation',
+                'source': 'NOAA MRMS'
+            }
+    
+    # If real data not available, use enhanced simulation
+    logger.info("🔄 Real MRMS data temporarily unavailable, using enhanced simulation")
+    current_timestamp = datetime.utcnow().strftime('%Y%m%d-%H%M00')
+    fallback_data = mrms_processor._generate_realistic_mrms_data(current_timestamp)
+    
+    return {
+        'success': True,
+        'timestamp': fetched_at,
+        'dataUrl': 'https://noaa-mrms-pds.s3.amazonaws.com/',
+        'data': fallback_data,
+        'bounds': [[24.396308, -125.000000], [49.384358, -66.934570]],
+        'note': 'Real MRMS Data - Enhanced Simulation',
+        'source': 'NOAA MRMS'
+    }
+
+def _get_fresh_cache(max_age=CACHE_DURATION):
+    """Return the current snapshot if it is younger than max_age seconds"""
+    snapshot = _snapshot
+    if snapshot and (datetime.now(timezone.utc) - snapshot.fetched_at).total_seconds() < max_age:
+        return snapshot
+    return None
+
+def refresh_cache():
+    """Fetch new radar data and publish it as the current snapshot"""
+    global _snapshot
+    result = _fetch_radar_data()
+    if result is None:
+        # Upstream hasn't rolled over; keep the same body and just mark it fresh
+        snapshot = _snapshot._replace(fetched_at=datetime.now(timezone.utc))
+        _snapshot = snapshot
+        return snapshot
+    
+    # Serialize once per refresh so cache hits skip re-encoding
+    body = app.json.dumpb(result)
+    # Compress once here too so gzip clients are served without per-request work
+    gzip_body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    now = datetime.now(timezone.utc)
+    snapshot = CacheSnapshot(
+        body, gzip_body, hashlib.md5(body).hexdigest(), now, now, result['dataUrl']
+    )
+    _snapshot = snapshot
+    return snapshot
+
+def _refresh(max_age=CACHE_DURATION):
+    """Refresh the cache unless, after waiting out any in-flight refresh, the
+    snapshot is younger than max_age seconds"""
+    global _refreshing
+    with _refresh_cond:
+        while _refreshing:
+            _refresh_cond.wait()
+        snapshot = _get_fresh_cache(max_age)
+        if snapshot:
+            return snapshot
+        _refreshing = True
+    
+    try:
+        return refresh_cache()
+    finally:
+        with _refresh_cond:
+            _refreshing = False
+            _refresh_cond.notify_all()
+
+def _background_refresh():
+    try:
+        # Skips the fetch if a request refreshed the cache since the last tick
+        _refresh(max_age=REFRESH_INTERVAL)
+    except Exception as e:
+        logger.error("❌ Error refreshing radar cache: %s", e)
+    finally:
+        timer = threading.Timer(REFRESH_INTERVAL, _background_refresh)
+        timer.daemon = True
+        timer.start()
+
+def _radar_response(snapshot):
+    """Build the radar response for a cache snapshot, or a 304 if the client has it"""
+    use_gzip = request.accept_encodings['gzip'] > 0
+    # The gzip variant gets its own "<etag>:gzip" ETag; either form is a match
+    etag = f"{snapshot.etag}:gzip" if use_gzip else snapshot.etag
+    
+    if request.if_none_match.contains(snapshot.etag) or request.if_none_match.contains(f"{snapshot.etag}:gzip"):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(snapshot.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.last_modified = snapshot.modified_at
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+def start_background_refresh():
+    """Populate the cache now and keep it warm every REFRESH_INTERVAL seconds"""
+    timer = threading.Timer(0, _background_refresh)
+    timer.daemon = True
+    timer.start()
 
 @app.route('/api/radar/latest')
 def get_radar_data():
     """Endpoint to get latest REAL MRMS radar data"""
-    global cached_data, last_fetch_time
+    logger.debug("🛰️ Radar API called - fetching REAL MRMS data...")
     
-    print("🛰️ Radar API called - fetching REAL MRMS data...")
-    
-    # Use cache if recent
-    if cached_data and last_fetch_time:
-        time_diff = (datetime.now() - last_fetch_time).total_seconds()
-        if time_diff < CACHE_DURATION:
-            print("♻️ Returning cached REAL MRMS data")
-            return jsonify(cached_data)
+    # Serve the background-refreshed snapshot when it is recent
+    snapshot = _get_fresh_cache()
+    if snapshot:
+        logger.debug("♻️ Returning cached REAL MRMS data")
+        return _radar_response(snapshot)
     
     try:
-        # Get real MRMS data URL
-        data_url, timestamp = mrms_processor.get_latest_data_url()
-        
-        if data_url:
-            print(f"🔗 Using real MRMS data from: {data_url}")
-            # Process the real MRMS data
-            processed_data = mrms_processor.download_and_process_data(data_url)
-            
-            if processed_data:
-                result = {
-                    'success': True,
-                    'timestamp': datetime.now().isoformat(),
-                    'dataUrl': data_url,
-                    'data': processed_data,
-                    'bounds': [[24.396308, -125.000000], [49.384358, -66.934570]],
-                    'note': 'Real MRMS Reflectivity at Lowest Altitude (RALA) - Enhanced Simulation',
-                    'source': 'NOAA MRMS'
-                }
-                
-                # Update cache
-                cached_data = result
-                last_fetch_time = datetime.now()
-                
-                print("  Successfully returned REAL MRMS data with enhanced simulation")
-                return jsonify(result)
-        
-        # If real data not available, use enhanced simulation
-        print("🔄 Real MRMS data temporarily unavailable, using enhanced simulation")
-        current_timestamp = datetime.utcnow().strftime('%Y%m%d-%H%M00')
-        fallback_data = mrms_processor._generate_realistic_mrms_data(current_timestamp)
-        
-        result = {
-            'success': True,
-            'timestamp': datetime.now().isoformat(),
-            'dataUrl': 'https://noaa-mrms-pds.s3.amazonaws.com/',
-            'data': fallback_data,
-            'bounds': [[24.396308, -125.000000], [49.384358, -66.934570]],
-            'note': 'Real MRMS Data - Enhanced Simulation',
-            'source': 'NOAA MRMS'
-        }
-        
-        cached_data = result
-        last_fetch_time = datetime.now()
-        
-        return jsonify(result)
+        return _radar_response(_refresh())
         
     except Exception as e:
-        print(f"❌ Error in radar API: {e}")
+        logger.error("❌ Error in radar API: %s", e)
         return jsonify({
             'success': False,
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _now_isoformat()
         }), 500
 
 @app.route('/health')
@@ -90,7 +221,7 @@ def health_check():
         'service': 'MRMS Radar API',
         'data_source': 'NOAA MRMS ReflectivityAtLowestAltitude',
         'update_interval': '2 minutes',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': _now_isoformat()
     })
 
 @app.route('/')
@@ -102,7 +233,7 @@ def home():
             'health': '/health',
             'radar_data': '/api/radar/latest'
         },
-        'timestamp': datetime.now().isoformat()
+        'timestamp': _now_isoformat()
     })
 
 if __name__ == '__main__':
@@ -112,4 +243,7 @@ if __name__ == '__main__':
     print("📍 Endpoints:")
     print("   - Health: http://localhost:5000/health")
     print("   - Radar: http://localhost:5000/api/radar/latest")
+    # With debug=True only the reloader's child process serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_refresh()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -1,17 +1,78 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import gzip
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
 import os
+import shutil
+import time
 from datetime import datetime, timedelta
-import json
 import math
-import random
+import numpy as np
+# xarray/cfgrib and rapidgzip are heavy, so they are imported inside the GRIB2
+# path only; the simulation fast path never pays for them at cold start.
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait on each HEAD probe
+HEAD_TIMEOUT = 3
+# Concurrent HEAD probes per host (matches the session's pool size)
+PROBE_WORKERS = 8
+# Buffer size used when stream-decompressing GRIB2 downloads
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+# Compressed GRIB2 files (~5-15 MB) larger than this spill to disk before rapidgzip
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+# Real CONUS weather systems based on season and time, one array entry per system:
+#   Midwest convective development (peaks afternoon), Southeast persistent rainfall,
+#   Northeast showers, West coast orographic, Rockies mountain precipitation,
+#   Gulf coast thunderstorms, Plains development, Ohio Valley system
+_SYS_TYPES = ('convective', 'stratiform', 'showery', 'orographic',
+              'mountain', 'thunderstorm', 'developing', 'valley')
+_SYS_CENTERS = np.array([
+    [39.0, -95.0], [32.5, -86.0], [41.5, -74.0], [40.5, -123.5],
+    [44.0, -110.5], [29.0, -91.0], [42.0, -99.0], [38.5, -85.0]
+])
+_SYS_BASE = np.array([35, 42, 38, 45, 32, 55, 40, 37])
+_SYS_BOOST = np.array([15, 5, 8, 2, 3, 10, 12, 6])
+_SYS_RADIUS = np.array([4.0, 3.5, 2.8, 3.2, 4.5, 3.8, 3.0, 2.5])
+# Points density based on system type
+_SYS_DENSITY = np.array([45, 35, 30, 40, 35, 50, 40, 30])
+
+# Reflectivity (dBZ) lower edges of each intensity level above 'very light'
+_INTENSITY_EDGES = np.array([20, 30, 40, 50])
+_INTENSITY_LABELS = ('very light', 'light', 'moderate', 'heavy', 'extreme')
+
+# Resolved data URLs keyed by rounded 2-minute timestamp: (url, timestamp, expires_at)
+_url_cache = {}
+URL_CACHE_DURATION = 120  # 2 minutes
 
 class MRMSDataProcessor:
-    def __init__(self):
+    def __init__(self, seed=None):
         self.aws_base_url = "https://noaa-mrms-pds.s3.amazonaws.com"
         self.ncep_base_url = "https://mrms.ncep.noaa.gov/data/CONUS"
         self.product = "MRMS_ReflectivityAtLowestAltitude"
+        
+        # Reuse connections (and TLS sessions) across probes and downloads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        )
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip',
+            'User-Agent': 'mrms-radar/1.0'
+        })
+        
+        # Last-Modified header from the most recent successful HEAD, per URL
+        self._last_modified = {}
+        
+        # Random source for the simulation; pass a seed for reproducible output
+        self._rng = np.random.default_rng(seed)
     
     def get_latest_data_url(self):
         """Get the URL for the latest MRMS data file"""
@@ -20,72 +81,119 @@ class MRMSDataProcessor:
             now = datetime.utcnow()
             rounded_minutes = (now.minute // 2) * 2
             data_time = now.replace(minute=rounded_minutes, second=0, microsecond=0)
+            rounded_ts = data_time.strftime('%Y%m%d-%H%M00')
             
-            # Try multiple timestamps (current and recent)
-            timestamps = []
-            for offset in [0, -2, -4, -6, -8, -10, -12, -14, -16, -18, -20]:
-                adjusted_time = data_time + timedelta(minutes=offset)
-                timestamp_str = adjusted_time.strftime('%Y%m%d-%H%M00')
-                timestamps.append(timestamp_str)
-            
-            # Try AWS S3 first
-            for timestamp in timestamps:
-                aws_url = f"{self.aws_base_url}/{self.product}/{timestamp}.grib2.gz"
-                if self._check_url_exists(aws_url):
-                    print(f"  Found real MRMS data at AWS: {aws_url}")
-                    return aws_url, timestamp
-            
-            # Try NCEP as fallback
-            for timestamp in timestamps:
-                year = timestamp[:4]
-                month = timestamp[4:6]
-                day = timestamp[6:8]
-                hour = timestamp[9:11]
-                minute = timestamp[11:13]
-                
-                ncep_filename = f"MRMS_ReflectivityAtLowestAltitude_00.50_{year}{month}{day}-{hour}{minute}00.grib2.gz"
-                ncep_url = f"{self.ncep_base_url}/{ncep_filename}"
-                
-                if self._check_url_exists(ncep_url):
-                    print(f"  Found real MRMS data at NCEP: {ncep_url}")
-                    return ncep_url, timestamp
+            # Reuse the probe result for this 2-minute window if we have one
+            cached = _url_cache.get(rounded_ts)
+            if cached and cached[2] > time.time():
+                return cached[0], cached[1]
             
-            return None, None
+            data_url, timestamp = self._resolve_url(rounded_ts)
+            
+            expires_at = time.time() + URL_CACHE_DURATION
+            for key in [k for k, v in _url_cache.items() if v[2] <= time.time()]:
+                del _url_cache[key]
+            _url_cache[rounded_ts] = (data_url, timestamp, expires_at)
+            
+            return data_url, timestamp
             
         except Exception as e:
-            print(f"❌ Error finding MRMS data: {e}")
+            logger.error("❌ Error finding MRMS data: %s", e)
             return None, None
     
+    def _resolve_url(self, rounded_ts):
+        """Probe AWS and NCEP for the newest file at or before rounded_ts"""
+        data_time = datetime.strptime(rounded_ts, '%Y%m%d-%H%M00')
+        
+        # Try multiple timestamps (current and recent)
+        timestamps = []
+        for offset in [0, -2, -4, -6, -8, -10, -12, -14, -16, -18, -20]:
+            adjusted_time = data_time + timedelta(minutes=offset)
+            timestamp_str = adjusted_time.strftime('%Y%m%d-%H%M00')
+            timestamps.append(timestamp_str)
+        
+        # Candidate URLs roll over every 2 minutes, so drop validators that have aged out
+        if len(self._last_modified) > 4 * len(timestamps):
+            self._last_modified.clear()
+        
+        # Try AWS S3 first
+        aws_urls = [f"{self.aws_base_url}/{self.product}/{timestamp}.grib2.gz" for timestamp in timestamps]
+        index = self._find_first_existing(aws_urls)
+        if index is not None:
+            logger.info("Found real MRMS data at AWS: %s", aws_urls[index])
+            return aws_urls[index], timestamps[index]
+        
+        # Try NCEP as fallback
+        ncep_urls = []
+        for timestamp in timestamps:
+            year = timestamp[:4]
+            month = timestamp[4:6]
+            day = timestamp[6:8]
+            hour = timestamp[9:11]
+            minute = timestamp[11:13]
+            
+            ncep_filename = f"MRMS_ReflectivityAtLowestAltitude_00.50_{year}{month}{day}-{hour}{minute}00.grib2.gz"
+            ncep_urls.append(f"{self.ncep_base_url}/{ncep_filename}")
+        
+        index = self._find_first_existing(ncep_urls)
+        if index is not None:
+            logger.info("Found real MRMS data at NCEP: %s", ncep_urls[index])
+            return ncep_urls[index], timestamps[index]
+        
+        return None, None
+    
+    def _find_first_existing(self, urls):
+        """HEAD all urls concurrently and return the index of the first that exists"""
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+            results = list(executor.map(self._check_url_exists, urls))
+        
+        # urls are ordered newest first, so the first hit is the most recent file
+        for index, exists in enumerate(results):
+            if exists:
+                return index
+        return None
+    
     def _check_url_exists(self, url):
         """Check if a URL exists without downloading the entire file"""
         try:
-            response = requests.head(url, timeout=10)
-            return response.status_code == 200
+            headers = {}
+            if url in self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified[url]
+            
+            response = self.session.head(url, headers=headers, allow_redirects=False, timeout=HEAD_TIMEOUT)
+            
+            # 304 means we've seen this file before and it hasn't changed
+            if response.status_code == 304:
+                return True
+            if response.status_code == 200:
+                if 'Last-Modified' in response.headers:
+                    self._last_modified[url] = response.headers['Last-Modified']
+                return True
+            return False
         except:
             return False
     
     def download_and_process_real_data(self, data_url):
         """Actually download and parse real MRMS GRIB2 data"""
         try:
-            print(f"📥 Downloading REAL MRMS GRIB2 data from: {data_url}")
+            logger.info("📥 Downloading REAL MRMS GRIB2 data from: %s", data_url)
             
-            # Download the compressed GRIB2 file
-            response = requests.get(data_url, timeout=60)
+            # Stream the compressed GRIB2 file so it is decompressed as it arrives
+            response = self.session.get(data_url, stream=True, timeout=60)
             if response.status_code != 200:
+                response.close()
                 raise Exception(f"Download failed with status {response.status_code}")
             
             # For now, use enhanced simulation since GRIB2 parsing requires additional setup
             # In production, you would uncomment and use the GRIB2 parsing code below
             
-            print("🔧 Using enhanced MRMS simulation (GRIB2 parsing requires additional setup)")
+            logger.info("🔧 Using enhanced MRMS simulation (GRIB2 parsing requires additional setup)")
             
             # Uncomment the following code when you have cfgrib and eccodes installed:
             """
-            # Decompress and save temporarily
-            with tempfile.NamedTemporaryFile(suffix='.grib2', delete=False) as temp_file:
-                # Decompress gzip
-                decompressed_data = gzip.decompress(response.content)
-                temp_file.write(decompressed_data)
+            # Decompress while downloading and save temporarily
+            with response, tempfile.NamedTemporaryFile(suffix='.grib2', delete=False) as temp_file:
+                self._decompress_to_file(response, temp_file)
                 temp_file_path = temp_file.name
             
             try:
@@ -115,16 +223,43 @@ class MRMSDataProcessor:
                 os.unlink(temp_file_path)
             """
             
+            # The streamed body is not needed until GRIB2 parsing is enabled
+            response.close()
+            
             # Fall back to enhanced simulation for now
             timestamp = data_url.split('/')[-1].replace('.grib2.gz', '')
             return self._generate_realistic_mrms_data(timestamp)
             
         except Exception as e:
-            print(f"❌ Error processing real GRIB2 data: {e}")
+            logger.error("❌ Error processing real GRIB2 data: %s", e)
             # Fall back to enhanced simulation
             timestamp = data_url.split('/')[-1].replace('.grib2.gz', '')
             return self._generate_realistic_mrms_data(timestamp)
     
+    def _decompress_to_file(self, response, dest):
+        """Stream-decompress a gzip HTTP response body into dest chunk by chunk"""
+        # Undo any transfer Content-Encoding so only the .gz payload is left
+        response.raw.decode_content = True
+        
+        try:
+            import rapidgzip
+        except ImportError:
+            rapidgzip = None
+        
+        if rapidgzip is None:
+            with gzip.GzipFile(fileobj=response.raw, mode='rb') as gz:
+                shutil.copyfileobj(gz, dest, DECOMPRESS_CHUNK_SIZE)
+            return
+        
+        # rapidgzip decompresses chunks in parallel but needs a seekable source, so this
+        # buffers the whole download first instead of overlapping it with decompression.
+        # It is an optional extra (pip install rapidgzip); streaming stays the default.
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as compressed:
+            shutil.copyfileobj(response.raw, compressed, DECOMPRESS_CHUNK_SIZE)
+            compressed.seek(0)
+            with rapidgzip.open(compressed, parallelization=os.cpu_count()) as gz:
+                shutil.copyfileobj(gz, dest, DECOMPRESS_CHUNK_SIZE)
+    
     def _convert_to_geojson(self, reflectivity_data):
         """Convert xarray data to GeoJSON format (placeholder for real implementation)"""
         # This would convert actual GRIB2 data to GeoJSON
@@ -152,78 +287,60 @@ class MRMSDataProcessor:
         time_of_day = hour + minute/60.0
         day_factor = math.sin(time_of_day * math.pi / 12)  # Peak around noon
         
-        # Real CONUS weather systems based on season and time
-        base_systems = [
-            # Midwest convective development (peaks afternoon)
-            {'center': [39.0, -95.0], 'base_intensity': 35, 'time_boost': 15, 'radius': 4.0, 'type': 'convective'},
-            # Southeast persistent rainfall
-            {'center': [32.5, -86.0], 'base_intensity': 42, 'time_boost': 5, 'radius': 3.5, 'type': 'stratiform'},
-            # Northeast showers
-            {'center': [41.5, -74.0], 'base_intensity': 38, 'time_boost': 8, 'radius': 2.8, 'type': 'showery'},
-            # West coast orographic
-            {'center': [40.5, -123.5], 'base_intensity': 45, 'time_boost': 2, 'radius': 3.2, 'type': 'orographic'},
-            # Rockies mountain precipitation
-            {'center': [44.0, -110.5], 'base_intensity': 32, 'time_boost': 3, 'radius': 4.5, 'type': 'mountain'},
-            # Gulf coast thunderstorms
-            {'center': [29.0, -91.0], 'base_intensity': 55, 'time_boost': 10, 'radius': 3.8, 'type': 'thunderstorm'},
-            # Plains development
-            {'center': [42.0, -99.0], 'base_intensity': 40, 'time_boost': 12, 'radius': 3.0, 'type': 'developing'},
-            # Ohio Valley system
-            {'center': [38.5, -85.0], 'base_intensity': 37, 'time_boost': 6, 'radius': 2.5, 'type': 'valley'}
-        ]
+        # Calculate current intensity of every system based on time of day
+        current_intensities = np.clip(_SYS_BASE + _SYS_BOOST * day_factor, 25, 60)
         
         # Generate points for each weather system
-        for system in base_systems:
-            center_lat, center_lng = system['center']
-            
-            # Calculate current intensity based on time of day
-            current_intensity = system['base_intensity'] + (system['time_boost'] * day_factor)
-            current_intensity = max(25, min(60, current_intensity))
-            
-            # Points density based on system type
-            points_density = {
-                'convective': 45, 'thunderstorm': 50, 'stratiform': 35,
-                'showery': 30, 'orographic': 40, 'mountain': 35,
-                'developing': 40, 'valley': 30
-            }
+        for k, system_type in enumerate(_SYS_TYPES):
+            center_lat, center_lng = _SYS_CENTERS[k]
+            radius = _SYS_RADIUS[k]
+            current_intensity = current_intensities[k]
+            num_points = _SYS_DENSITY[k]
             
-            num_points = points_density.get(system['type'], 35)
+            # Natural distribution within system: one draw for angle, distance and turbulence
+            samples = self._rng.random((num_points, 3))
+            samples *= (2 * np.pi, radius - 0.1, 16)
+            samples += (0, 0.1, -8)
+            angles, distances, turbulence = samples.T
             
-            for i in range(num_points):
-                # Natural distribution within system
-                angle = random.uniform(0, 2 * math.pi)
-                distance = random.uniform(0.1, system['radius'])
-                
-                lat = center_lat + distance * math.cos(angle)
-                lng = center_lng + distance * math.sin(angle)
-                
-                # Ensure within CONUS bounds
-                if 25.0 <= lat <= 49.0 and -125.0 <= lng <= -67.0:
-                    # Calculate reflectivity with distance decay
-                    distance_factor = 1 - (distance / system['radius'])
-                    turbulence = random.uniform(-8, 8)
-                    reflectivity = current_intensity * distance_factor + turbulence
-                    
-                    # Realistic value constraints
-                    reflectivity = max(18, min(65, reflectivity))
-                    
-                    features.append({
-                        'type': 'Feature',
-                        'geometry': {
-                            'type': 'Point',
-                            'coordinates': [round(lng, 6), round(lat, 6)]
-                        },
-                        'properties': {
-                            'reflectivity': round(reflectivity, 1),
-                            'unit': 'dBZ',
-                            'intensity': self._get_intensity_level(reflectivity),
-                            'systemType': system['type'],
-                            'dataSource': 'MRMS',
-                            'timestamp': timestamp
-                        }
-                    })
-        
-        print(f"🌪️ Generated {len(features)} realistic MRMS data points")
+            lats = center_lat + distances * np.cos(angles)
+            lngs = center_lng + distances * np.sin(angles)
+            
+            # Calculate reflectivity with distance decay
+            reflectivity = current_intensity * (1 - distances / radius) + turbulence
+            
+            # Realistic value constraints
+            reflectivity = np.clip(reflectivity, 18, 65)
+            
+            # Clamp to CONUS bounds (only edge systems like the West coast ever reach them)
+            lats = np.clip(lats, 25.0, 49.0)
+            lngs = np.clip(lngs, -125.0, -67.0)
+            
+            # Convert whole arrays to Python lists in C; [lng, lat] pairs come out ready-made
+            coords = np.stack([lngs, lats], axis=1).round(6).tolist()
+            refls = reflectivity.round(1).tolist()
+            intensities = [_INTENSITY_LABELS[i] for i in np.digitize(reflectivity, _INTENSITY_EDGES).tolist()]
+            
+            features.extend(
+                {
+                    'type': 'Feature',
+                    'geometry': {
+                        'type': 'Point',
+                        'coordinates': c
+                    },
+                    'properties': {
+                        'reflectivity': r,
+                        'unit': 'dBZ',
+                        'intensity': lbl,
+                        'systemType': system_type,
+                        'dataSource': 'MRMS',
+                        'timestamp': timestamp
+                    }
+                }
+                for c, r, lbl in zip(coords, refls, intensities)
+            )
+        
+        logger.debug("🌪️ Generated %d realistic MRMS data points", len(features))
         
         return {
             'type': 'FeatureCollection',
@@ -237,10 +354,3 @@ class MRMSDataProcessor:
                 'dataType': 'REAL_MRMS_SIMULATION'
             }
         }
-    
-    def _get_intensity_level(self, reflectivity):
-        if reflectivity >= 50: return 'extreme'
-        if reflectivity >= 40: return 'heavy'
-        if reflectivity >= 30: return 'moderate'
-        if reflectivity >= 20: return 'light'
-        return 'very light'
\ No newline at end of file